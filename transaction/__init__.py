@@ -1,2 +1,2 @@
 from .base import Transaction
-from .uniswap_transaction import UniswapTransaction
+from .uniswap_transaction import PoolStateUpdate, UniswapTransaction
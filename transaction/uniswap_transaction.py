@@ -1,7 +1,12 @@
+import functools
+import logging
 import web3
-import itertools
 
-from typing import List, Optional, Tuple, Union
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_abi_to_4byte_selector
+from hexbytes import HexBytes
+from itertools import chain
+from typing import List, NamedTuple, Optional, Tuple, Union
 from degenbot.exceptions import (
     LiquidityPoolError,
     EVMRevertError,
@@ -18,9 +23,22 @@ from degenbot.uniswap.v3.abi import (
     UNISWAP_V3_ROUTER_ABI,
     UNISWAP_V3_ROUTER2_ABI,
 )
+from degenbot.uniswap.functions import decode_v3_path
 from degenbot.uniswap.v3 import V3LiquidityPool
 from degenbot.manager import Erc20TokenHelperManager
 
+logger = logging.getLogger(__name__)
+
+
+class PoolStateUpdate(NamedTuple):
+    """
+    A pool touched by a simulated transaction, and its predicted state after
+    the transaction is executed
+    """
+
+    pool: Union[LiquidityPool, V3LiquidityPool]
+    state: dict
+
 
 # Internal dict of known router contracts, pre-populated with mainnet addresses
 # Stored at the class level so routers can be added via class method `add_router`
@@ -54,9 +72,230 @@ _routers = {
         },
     },
 }
+_ROUTER_KEYS = frozenset(_routers)
+# (V2 factory, V3 factory) addresses for each router, None if not deployed
+_ROUTER_FACTORIES = {
+    router_address: (
+        router["factory_address"].get(2),
+        router["factory_address"].get(3),
+    )
+    for router_address, router in _routers.items()
+}
+
+
+# Provider-less Web3 instance, only used to build the decoding contracts
+_W3 = web3.Web3()
+
+# Contract objects used to decode multicall payloads, built once since
+# each construction parses the full ABI
+_ROUTER_CONTRACT = _W3.eth.contract(abi=UNISWAP_V3_ROUTER_ABI)
+_ROUTER2_CONTRACT = _W3.eth.contract(abi=UNISWAP_V3_ROUTER2_ABI)
+
+# 4-byte function selector -> decoding contract. Router2 is added last, so it
+# takes precedence for any selector present in both ABIs
+_SELECTOR_TO_CONTRACT = {
+    function_abi_to_4byte_selector(function_abi): contract
+    for contract in (_ROUTER_CONTRACT, _ROUTER2_CONTRACT)
+    for function_abi in contract.abi
+    if function_abi.get("type") == "function"
+}
+
+# Field names for the V3 single-pool swap params, keyed by tuple length
+_V3_EXACT_IN_SCHEMAS = {
+    # Router ABI
+    # https://github.com/Uniswap/v3-periphery/blob/main/contracts/interfaces/ISwapRouter.sol
+    8: (
+        "tokenIn",
+        "tokenOut",
+        "fee",
+        "recipient",
+        "deadline",
+        "amountIn",
+        "amountOutMinimum",
+        "sqrtPriceLimitX96",
+    ),
+    # Router2 ABI
+    # https://github.com/Uniswap/swap-router-contracts/blob/main/contracts/interfaces/IV3SwapRouter.sol
+    7: (
+        "tokenIn",
+        "tokenOut",
+        "fee",
+        "recipient",
+        "amountIn",
+        "amountOutMinimum",
+        "sqrtPriceLimitX96",
+    ),
+}
+
+_V3_EXACT_OUT_SCHEMAS = {
+    # Router ABI
+    8: (
+        "tokenIn",
+        "tokenOut",
+        "fee",
+        "recipient",
+        "deadline",
+        "amountOut",
+        "amountInMaximum",
+        "sqrtPriceLimitX96",
+    ),
+    # Router2 ABI
+    7: (
+        "tokenIn",
+        "tokenOut",
+        "fee",
+        "recipient",
+        "amountOut",
+        "amountInMaximum",
+        "sqrtPriceLimitX96",
+    ),
+}
+
+# Field names for the V3 multi-pool swap params, keyed by tuple length
+_V3_EXACT_INPUT_SCHEMAS = {
+    # Router ABI
+    5: (
+        "path",
+        "recipient",
+        "deadline",
+        "amountIn",
+        "amountOutMinimum",
+    ),
+    # Router2 ABI
+    4: (
+        "path",
+        "recipient",
+        "amountIn",
+        "amountOutMinimum",
+    ),
+}
+
+_V3_EXACT_OUTPUT_SCHEMAS = {
+    # Router ABI
+    5: (
+        "path",
+        "recipient",
+        "deadline",
+        "amountOut",
+        "amountInMaximum",
+    ),
+    # Router2 ABI
+    4: (
+        "path",
+        "recipient",
+        "amountOut",
+        "amountInMaximum",
+    ),
+}
+
+# UniswapV2 router functions, grouped by the helper that simulates them
+_V2_EXACT_IN_NAMES = frozenset(
+    {
+        "swapExactTokensForETH",
+        "swapExactTokensForETHSupportingFeeOnTransferTokens",
+        "swapExactTokensForTokens",
+        "swapExactTokensForTokensSupportingFeeOnTransferTokens",
+    }
+)
+_V2_EXACT_IN_ETH_NAMES = frozenset(
+    {
+        "swapExactETHForTokens",
+        "swapExactETHForTokensSupportingFeeOnTransferTokens",
+    }
+)
+_V2_EXACT_OUT_NAMES = frozenset(
+    {
+        "swapTokensForExactETH",
+        "swapTokensForExactTokens",
+    }
+)
+_V2_EXACT_OUT_ETH_NAMES = frozenset(
+    {
+        "swapETHForExactTokens",
+    }
+)
+
+# UniswapV2 liquidity functions, not yet simulated
+_LIQUIDITY_FUNCS = frozenset(
+    {
+        "addLiquidity",
+        "addLiquidityETH",
+        "removeLiquidity",
+        "removeLiquidityETH",
+        "removeLiquidityETHWithPermit",
+        "removeLiquidityETHSupportingFeeOnTransferTokens",
+        "removeLiquidityETHWithPermitSupportingFeeOnTransferTokens",
+        "removeLiquidityWithPermit",
+    }
+)
+
+# Router functions that do not affect future pool states
+_IGNORED_FUNCS = frozenset(
+    {
+        "refundETH",
+        "selfPermit",
+        "selfPermitAllowed",
+        "unwrapWETH9",
+    }
+)
+
+
+@functools.lru_cache(maxsize=8192)
+def _to_checksum(address: str) -> str:
+    """
+    Checksum an address, caching the result to avoid repeated keccak hashing
+    """
+
+    return web3.Web3.toChecksumAddress(address)
+
+
+def _v3_pool_key(
+    token_addresses: Tuple[str, str], pool_fee: int
+) -> Tuple[str, str, int]:
+    """
+    Build an order-independent cache key for a V3 pool from its token
+    addresses and fee
+    """
+
+    return (*sorted(map(_to_checksum, token_addresses)), pool_fee)
+
+
+def _decode_multicall_payload(payload) -> Tuple[str, dict]:
+    """
+    Decode a multicall payload into its function name and arguments, using
+    the router ABI that holds its 4-byte function selector
+    """
+
+    selector = bytes(HexBytes(payload)[:4])
+    if (contract := _SELECTOR_TO_CONTRACT.get(selector)) is None:
+        raise TransactionError(
+            f"Could not decode multicall: unknown selector {selector.hex()}"
+        )
+
+    try:
+        payload_func, payload_args = contract.decode_function_input(payload)
+    except (DecodingError, ValueError) as e:
+        raise TransactionError(f"Could not decode multicall: {e}")
+
+    return payload_func.fn_name, payload_args
+
+
+def _freeze(value):
+    """
+    Recursively convert a decoded function argument into a hashable value
+    """
+
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(val)) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    return value
 
 
 class UniswapTransaction(Transaction):
+
+    _token_manager = Erc20TokenHelperManager()
+
     def __init__(
         self,
         tx_hash: str,
@@ -67,56 +306,88 @@ class UniswapTransaction(Transaction):
         router_address: str,
     ):
 
-        self.routers = _routers
-
-        if router_address not in self.routers.keys():
+        router_address = _to_checksum(router_address)
+        if router_address not in _ROUTER_KEYS:
             raise ValueError(f"Router address {router_address} unknown!")
 
-        try:
-            self.v2_pool_manager = UniswapV2LiquidityPoolManager(
-                factory_address=self.routers[router_address][
-                    "factory_address"
-                ][2]
-            )
-        except:
-            pass
-
-        try:
-            self.v3_pool_manager = UniswapV3LiquidityPoolManager(
-                factory_address=self.routers[router_address][
-                    "factory_address"
-                ][3]
-            )
-        except:
-            pass
-
+        self._router_address = router_address
         self.hash = tx_hash
         self.nonce = tx_nonce
         self.value = tx_value
         self.func_name = func_name
         self.func_params = func_params
         self.func_deadline = func_params.get("deadline")
-        self.func_previous_block_hash = (
-            hash.hex()
-            if (hash := self.func_params.get("previousBlockhash"))
-            else None
+        self.func_previous_block_hash_bytes = func_params.get(
+            "previousBlockhash"
         )
 
+        # simulation results, keyed by function name and frozen params. Only
+        # set while a multicall is being simulated, so identical payloads in
+        # one bundle are simulated once and results never outlive the call
+        self._sim_cache = None
+        # V3 pool helpers, keyed by sorted token addresses and fee
+        self._v3_pool_cache = {}
+
+    @functools.cached_property
+    def v2_pool_manager(self) -> UniswapV2LiquidityPoolManager:
+        """
+        The V2 pool manager for the router's factory, built on first use
+        """
+
+        factory_address, _ = _ROUTER_FACTORIES[self._router_address]
+        if factory_address is None:
+            raise TransactionError(
+                f"Router {self._router_address} has no V2 factory"
+            )
+
+        return UniswapV2LiquidityPoolManager(factory_address=factory_address)
+
+    @functools.cached_property
+    def v3_pool_manager(self) -> UniswapV3LiquidityPoolManager:
+        """
+        The V3 pool manager for the router's factory, built on first use
+        """
+
+        _, factory_address = _ROUTER_FACTORIES[self._router_address]
+        if factory_address is None:
+            raise TransactionError(
+                f"Router {self._router_address} has no V3 factory"
+            )
+
+        return UniswapV3LiquidityPoolManager(factory_address=factory_address)
+
+    @property
+    def func_previous_block_hash(self) -> Optional[str]:
+        if previous_block_hash := self.func_previous_block_hash_bytes:
+            return previous_block_hash.hex()
+        return None
+
     @classmethod
     def add_router(cls, router_address: str, router_dict: dict):
 
-        router_address = web3.Web3.toChecksumAddress(router_address)
-        if router_address in _routers.keys():
+        global _ROUTER_KEYS
+
+        router_address = _to_checksum(router_address)
+        if router_address in _ROUTER_KEYS:
             raise ValueError("Router address already known!")
 
+        # read the factories first, so an invalid router_dict raises before
+        # any of the lookup tables are modified
+        factories = (
+            router_dict["factory_address"].get(2),
+            router_dict["factory_address"].get(3),
+        )
+
         _routers[router_address] = router_dict
+        _ROUTER_KEYS = frozenset(_routers)
+        _ROUTER_FACTORIES[router_address] = factories
 
     def simulate(
         self,
         func_name: Optional[str] = None,
         func_params: Optional[dict] = None,
         silent: bool = False,
-    ) -> List[Tuple[Union[LiquidityPool, V3LiquidityPool], dict]]:
+    ) -> List[PoolStateUpdate]:
         """
         Take a Uniswap V2 / V3 transaction (specified by name and a dictionary of arguments
         to that function) and return a list of pools and state dictionaries for all hops
@@ -127,32 +398,31 @@ class UniswapTransaction(Transaction):
             params: dict,
             unwrapped_input: Optional[bool] = False,
             silent: bool = False,
-        ) -> List[Tuple[LiquidityPool, dict]]:
+        ) -> List[PoolStateUpdate]:
 
-            v2_pool_objects = []
-            for token_addresses in itertools.pairwise(params.get("path")):
-                try:
-                    pool_helper: LiquidityPool = self.v2_pool_manager.get_pool(
-                        token_addresses=token_addresses,
-                        silent=silent,
-                    )
-                except LiquidityPoolError:
-                    raise TransactionError(
-                        f"LiquidityPool could not be build for token pair {token_addresses[0]} - {token_addresses[1]}"
-                    )
-                else:
-                    v2_pool_objects.append(pool_helper)
+            path = params["path"]
+
+            # fetch all pools in the path with a single batched lookup
+            try:
+                v2_pool_objects = self.v2_pool_manager.get_pools_batch(
+                    token_address_pairs=list(zip(path, path[1:])),
+                    silent=silent,
+                )
+            except (ManagerError, LiquidityPoolError) as e:
+                raise TransactionError(
+                    f"LiquidityPool could not be built for path {path}: {e}"
+                )
 
             # the pool manager created Erc20Token objects in the code block above,
             # so calls to `get_erc20token` will return the previously-created helper
-            token_in = Erc20TokenHelperManager().get_erc20token(
-                address=params["path"][0],
+            token_in = self._token_manager.get_erc20token(
+                address=path[0],
                 silent=silent,
                 min_abi=True,
                 unload_brownie_contract_after_init=True,
             )
-            token_out = Erc20TokenHelperManager().get_erc20token(
-                address=params["path"][-1],
+            token_out = self._token_manager.get_erc20token(
+                address=path[-1],
                 silent=silent,
                 min_abi=True,
                 unload_brownie_contract_after_init=True,
@@ -165,7 +435,10 @@ class UniswapTransaction(Transaction):
 
             # predict future pool states assuming the swap executes in isolation
             future_pool_states = []
+            future_pool_states_append = future_pool_states.append
             for i, v2_pool in enumerate(v2_pool_objects):
+                t0 = v2_pool.token0
+                t1 = v2_pool.token1
                 token_in_quantity = (
                     swap_in_quantity if i == 0 else token_out_quantity
                 )
@@ -174,62 +447,38 @@ class UniswapTransaction(Transaction):
                 # otherwise, set token_in equal to token_out from previous iteration
                 # and token_out equal to the other token held by the pool
                 token_in = token_in if i == 0 else token_out
-                token_out = (
-                    v2_pool.token0
-                    if token_in is v2_pool.token1
-                    else v2_pool.token1
-                )
+                token_out = t0 if token_in is t1 else t1
 
-                current_state = v2_pool.state
                 swap_info, future_state = v2_pool.simulate_swap(
                     token_in=token_in,
                     token_in_quantity=token_in_quantity,
                 )
 
-                if (
-                    future_state["reserves_token0"]
-                    < current_state["reserves_token0"]
-                ):
-                    token_out_quantity = (
-                        current_state["reserves_token0"]
-                        - future_state["reserves_token0"]
-                    )
-                elif (
-                    future_state["reserves_token1"]
-                    < current_state["reserves_token1"]
-                ):
-                    token_out_quantity = (
-                        current_state["reserves_token1"]
-                        - future_state["reserves_token1"]
-                    )
-                else:
-                    raise ValueError("Swap direction could not be identified")
+                # swap output is negative from the POV of the pool
+                token_out_quantity = -min(
+                    swap_info["amount0_delta"],
+                    swap_info["amount1_delta"],
+                )
 
-                future_pool_states.append(
-                    (
-                        v2_pool,
-                        future_state,
-                    )
+                future_pool_states_append(
+                    PoolStateUpdate(v2_pool, future_state)
                 )
 
                 if not silent:
-                    print(f"Simulating swap through pool: {v2_pool}")
-                    print(
-                        f"\t{token_in_quantity} {token_in} -> {token_out_quantity} {token_out}"
-                    )
-                    print("\t(CURRENT)")
-                    print(
-                        f"\t{v2_pool.token0}: {current_state['reserves_token0']}"
-                    )
-                    print(
-                        f"\t{v2_pool.token1}: {current_state['reserves_token1']}"
-                    )
-                    print(f"\t(FUTURE)")
+                    current_state = v2_pool.state
+                    cr0 = current_state["reserves_token0"]
+                    cr1 = current_state["reserves_token1"]
+                    fr0 = future_state["reserves_token0"]
+                    fr1 = future_state["reserves_token1"]
                     print(
-                        f"\t{v2_pool.token0}: {future_state['reserves_token0']}"
-                    )
-                    print(
-                        f"\t{v2_pool.token1}: {future_state['reserves_token1']}"
+                        f"Simulating swap through pool: {v2_pool}\n"
+                        f"\t{token_in_quantity} {token_in} -> {token_out_quantity} {token_out}\n"
+                        "\t(CURRENT)\n"
+                        f"\t{t0}: {cr0}\n"
+                        f"\t{t1}: {cr1}\n"
+                        "\t(FUTURE)\n"
+                        f"\t{t0}: {fr0}\n"
+                        f"\t{t1}: {fr1}"
                     )
 
             return future_pool_states
@@ -238,32 +487,31 @@ class UniswapTransaction(Transaction):
             params: dict,
             unwrapped_input: Optional[bool] = False,
             silent: bool = False,
-        ) -> List[Tuple[LiquidityPool, dict]]:
+        ) -> List[PoolStateUpdate]:
 
-            pool_objects: List[LiquidityPool] = []
-            for token_addresses in itertools.pairwise(params.get("path")):
-                try:
-                    pool_helper: LiquidityPool = self.v2_pool_manager.get_pool(
-                        token_addresses=token_addresses,
-                        silent=silent,
-                    )
-                except LiquidityPoolError:
-                    raise TransactionError(
-                        f"Liquidity pool could not be build for token pair {token_addresses[0]} - {token_addresses[1]}"
-                    )
-                else:
-                    pool_objects.append(pool_helper)
+            path = params["path"]
+
+            # fetch all pools in the path with a single batched lookup
+            try:
+                pool_objects = self.v2_pool_manager.get_pools_batch(
+                    token_address_pairs=list(zip(path, path[1:])),
+                    silent=silent,
+                )
+            except (ManagerError, LiquidityPoolError) as e:
+                raise TransactionError(
+                    f"Liquidity pool could not be built for path {path}: {e}"
+                )
 
             # the pool manager creates Erc20Token objects as it works,
             # so calls to `get_erc20token` will return the previously-created helper
-            token_in = Erc20TokenHelperManager().get_erc20token(
-                address=params["path"][0],
+            token_in = self._token_manager.get_erc20token(
+                address=path[0],
                 silent=silent,
                 min_abi=True,
                 unload_brownie_contract_after_init=True,
             )
-            token_out = Erc20TokenHelperManager().get_erc20token(
-                address=params["path"][-1],
+            token_out = self._token_manager.get_erc20token(
+                address=path[-1],
                 silent=silent,
                 min_abi=True,
                 unload_brownie_contract_after_init=True,
@@ -277,73 +525,48 @@ class UniswapTransaction(Transaction):
             # predict future pool states assuming the swap executes in isolation
             # work through the pools backwards, since the swap will execute at a defined output, with input floating
             future_pool_states = []
-            for i, pool in enumerate(pool_objects[::-1]):
+            future_pool_states_append = future_pool_states.append
+            for i, pool in enumerate(reversed(pool_objects)):
+                t0 = pool.token0
+                t1 = pool.token1
                 token_out_quantity = (
-                    swap_out_quantity if i == 0 else token_out_quantity
+                    swap_out_quantity if i == 0 else token_in_quantity
                 )
 
                 # i == 0 for last pool in path, take from 'path' in func_params
                 # otherwise, set token_out equal to token_in from previous iteration
                 # and token_in equal to the other token held by the pool
                 token_out = token_out if i == 0 else token_in
-                token_in = (
-                    pool.token0 if token_out is pool.token1 else pool.token1
-                )
+                token_in = t0 if token_out is t1 else t1
 
-                current_state = pool.state
                 swap_info, future_state = pool.simulate_swap(
                     token_out=token_out,
                     token_out_quantity=token_out_quantity,
                 )
 
-                # print(f"{i}: {token_in} -> {token_out}")
-                # print(f"{current_state=}")
-                # print(f"{future_state=}")
-
-                if (
-                    future_state["reserves_token0"]
-                    > current_state["reserves_token0"]
-                ):
-                    token_in_quantity = (
-                        future_state["reserves_token0"]
-                        - current_state["reserves_token0"]
-                    )
-                elif (
-                    future_state["reserves_token1"]
-                    > current_state["reserves_token1"]
-                ):
-                    token_in_quantity = (
-                        future_state["reserves_token1"]
-                        - current_state["reserves_token1"]
-                    )
-                else:
-                    raise ValueError("Swap direction could not be identified")
-
-                future_pool_states.append(
-                    (
-                        pool,
-                        future_state,
-                    )
+                # swap input is positive from the POV of the pool
+                token_in_quantity = max(
+                    swap_info["amount0_delta"],
+                    swap_info["amount1_delta"],
                 )
 
+                future_pool_states_append(PoolStateUpdate(pool, future_state))
+
                 if not silent:
-                    print(f"Simulating swap through pool: {pool}")
-                    print(
-                        f"\t{token_in_quantity} {token_in} -> {token_out_quantity} {token_out}"
-                    )
-                    print("\t(CURRENT)")
+                    current_state = pool.state
+                    cr0 = current_state["reserves_token0"]
+                    cr1 = current_state["reserves_token1"]
+                    fr0 = future_state["reserves_token0"]
+                    fr1 = future_state["reserves_token1"]
                     print(
-                        f"\t{pool.token0}: {current_state['reserves_token0']}"
-                    )
-                    print(
-                        f"\t{pool.token1}: {current_state['reserves_token1']}"
-                    )
-                    print(f"\t(FUTURE)")
-                    print(
-                        f"\t{pool.token0}: {future_state['reserves_token0']}"
-                    )
-                    print(
-                        f"\t{pool.token1}: {future_state['reserves_token1']}"
+                        f"Simulating swap through pool: {pool}\n"
+                        f"\t{token_in_quantity} {token_in} -> {token_out_quantity} {token_out}\n"
+                        "\t(CURRENT)\n"
+                        f"\t{t0}: {cr0}\n"
+                        f"\t{t1}: {cr1}\n"
+                        "\t(FUTURE)\n"
+                        f"\t{t0}: {fr0}\n"
+                        f"\t{t1}: {fr1}"
                     )
 
             # if swap_in_quantity < token_in_quantity:
@@ -351,184 +574,167 @@ class UniswapTransaction(Transaction):
 
             return future_pool_states
 
-        def v3_swap_exact_in(
-            params: dict,
+        def get_v3_pool(
+            token_addresses: Tuple[str, str],
+            pool_fee: int,
             silent: bool = False,
-        ) -> List[Tuple[V3LiquidityPool, dict]]:
+        ) -> V3LiquidityPool:
 
-            # decode with Router ABI
-            # https://github.com/Uniswap/v3-periphery/blob/main/contracts/interfaces/ISwapRouter.sol
-            try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    recipient,
-                    deadline,
-                    amountIn,
-                    amountOutMinimum,
-                    sqrtPriceLimitX96,
-                ) = params.get("params")
-            except:
-                pass
-
-            # decode with Router2 ABI
-            # https://github.com/Uniswap/swap-router-contracts/blob/main/contracts/interfaces/IV3SwapRouter.sol
-            try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    recipient,
-                    amountIn,
-                    amountOutMinimum,
-                    sqrtPriceLimitX96,
-                ) = params.get("params")
-            except:
-                pass
-
-            # decode values from exactInput (hand-crafted)
-            try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    amountIn,
-                ) = params.get("params")
-            except:
-                pass
+            # pools are memoized for the lifetime of the transaction
+            pool_key = _v3_pool_key(token_addresses, pool_fee)
 
-            try:
-                # get the V3 pool involved in the swap
+            if (v3_pool := self._v3_pool_cache.get(pool_key)) is None:
                 v3_pool = self.v3_pool_manager.get_pool(
-                    token_addresses=(tokenIn, tokenOut),
-                    pool_fee=fee,
+                    token_addresses=token_addresses,
+                    pool_fee=pool_fee,
                     silent=silent,
                 )
-            except (ManagerError, LiquidityPoolError) as e:
-                raise TransactionError(f"Could not get pool (via tokens): {e}")
-            except:
-                raise
+                self._v3_pool_cache[pool_key] = v3_pool
+
+            return v3_pool
+
+        def v3_pool_swap_exact_in(
+            v3_pool: V3LiquidityPool,
+            token_in_address: str,
+            amount_in: int,
+            silent: bool = False,
+        ) -> Tuple[dict, dict]:
 
             if not silent:
                 print(f"Predicting output of swap through pool: {v3_pool}")
 
             try:
-                token_in_object = Erc20TokenHelperManager().get_erc20token(
-                    address=tokenIn,
+                token_in_object = self._token_manager.get_erc20token(
+                    address=token_in_address,
                     silent=silent,
                     min_abi=True,
                     unload_brownie_contract_after_init=True,
                 )
-            except Exception as e:
-                print(e)
-                print(type(e))
-                raise
+            except ManagerError as e:
+                raise TransactionError(f"Could not get token: {e}")
 
             try:
-                swap_info, final_state = v3_pool.simulate_swap(
+                return v3_pool.simulate_swap(
                     token_in=token_in_object,
-                    token_in_quantity=amountIn,
+                    token_in_quantity=amount_in,
                 )
             except EVMRevertError as e:
                 raise TransactionError(
                     f"V3 operation could not be simulated: {e}"
                 )
 
-            return [
-                (
-                    v3_pool,
-                    final_state,
-                )
-            ]
-
-        def v3_swap_exact_out(
-            params: dict,
+        def v3_pool_swap_exact_out(
+            v3_pool: V3LiquidityPool,
+            token_out_address: str,
+            amount_out: int,
+            sqrt_price_limit: Optional[int] = None,
             silent: bool = False,
-        ) -> List[Tuple[V3LiquidityPool, dict]]:
+        ) -> Tuple[dict, dict]:
 
-            sqrtPriceLimitX96 = None
-            amountInMaximum = None
+            if not silent:
+                print(f"Predicting output of swap through pool: {v3_pool}")
 
-            # decode with Router ABI
-            # https://github.com/Uniswap/v3-periphery/blob/main/contracts/interfaces/ISwapRouter.sol
             try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    recipient,
-                    deadline,
-                    amountOut,
-                    amountInMaximum,
-                    sqrtPriceLimitX96,
-                ) = params.get("params")
-            except:
-                pass
+                token_out_object = self._token_manager.get_erc20token(
+                    address=token_out_address,
+                    silent=silent,
+                    min_abi=True,
+                    unload_brownie_contract_after_init=True,
+                )
+            except ManagerError as e:
+                raise TransactionError(f"Could not get token: {e}")
 
-            # decode with Router2 ABI
-            # https://github.com/Uniswap/swap-router-contracts/blob/main/contracts/interfaces/IV3SwapRouter.sol
             try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    recipient,
-                    amountOut,
-                    amountInMaximum,
-                    sqrtPriceLimitX96,
-                ) = params.get("params")
-            except:
-                pass
+                return v3_pool.simulate_swap(
+                    token_out=token_out_object,
+                    token_out_quantity=amount_out,
+                    sqrt_price_limit=sqrt_price_limit,
+                )
+            except EVMRevertError as e:
+                raise TransactionError(
+                    f"V3 operation could not be simulated: {e}"
+                )
+
+        def v3_swap_exact_in(
+            params: dict,
+            silent: bool = False,
+        ) -> List[PoolStateUpdate]:
+
+            raw_params = params["params"]
 
-            # decode values from exactOutput (hand-crafted)
             try:
-                (
-                    tokenIn,
-                    tokenOut,
-                    fee,
-                    amountOut,
-                ) = params.get("params")
-            except:
-                pass
+                fields = dict(
+                    zip(_V3_EXACT_IN_SCHEMAS[len(raw_params)], raw_params)
+                )
+            except KeyError:
+                raise TransactionError(
+                    f"Could not decode exactInput params: {raw_params}"
+                )
+
+            tokenIn = fields["tokenIn"]
+            tokenOut = fields["tokenOut"]
+            fee = fields["fee"]
+            amountIn = fields["amountIn"]
 
             try:
                 # get the V3 pool involved in the swap
-                v3_pool = self.v3_pool_manager.get_pool(
+                v3_pool = get_v3_pool(
                     token_addresses=(tokenIn, tokenOut),
                     pool_fee=fee,
                     silent=silent,
                 )
             except (ManagerError, LiquidityPoolError) as e:
                 raise TransactionError(f"Could not get pool (via tokens): {e}")
-            except:
-                raise
 
-            if not silent:
-                print(f"Predicting output of swap through pool: {v3_pool}")
+            swap_info, final_state = v3_pool_swap_exact_in(
+                v3_pool=v3_pool,
+                token_in_address=tokenIn,
+                amount_in=amountIn,
+                silent=silent,
+            )
 
-            try:
-                token_out_object = Erc20TokenHelperManager().get_erc20token(
-                    address=tokenOut,
-                    silent=silent,
-                    min_abi=True,
-                    unload_brownie_contract_after_init=True,
-                )
-            except Exception as e:
-                print(e)
-                print(type(e))
-                raise
+            return [PoolStateUpdate(v3_pool, final_state)]
+
+        def v3_swap_exact_out(
+            params: dict,
+            silent: bool = False,
+        ) -> List[PoolStateUpdate]:
+
+            raw_params = params["params"]
 
             try:
-                swap_info, final_state = v3_pool.simulate_swap(
-                    token_out=token_out_object,
-                    token_out_quantity=amountOut,
-                    sqrt_price_limit=sqrtPriceLimitX96,
+                fields = dict(
+                    zip(_V3_EXACT_OUT_SCHEMAS[len(raw_params)], raw_params)
                 )
-            except EVMRevertError as e:
+            except KeyError:
                 raise TransactionError(
-                    f"V3 operation could not be simulated: {e}"
+                    f"Could not decode exactOutput params: {raw_params}"
+                )
+
+            tokenIn = fields["tokenIn"]
+            tokenOut = fields["tokenOut"]
+            fee = fields["fee"]
+            amountOut = fields["amountOut"]
+            amountInMaximum = fields["amountInMaximum"]
+            sqrtPriceLimitX96 = fields["sqrtPriceLimitX96"]
+
+            try:
+                # get the V3 pool involved in the swap
+                v3_pool = get_v3_pool(
+                    token_addresses=(tokenIn, tokenOut),
+                    pool_fee=fee,
+                    silent=silent,
                 )
+            except (ManagerError, LiquidityPoolError) as e:
+                raise TransactionError(f"Could not get pool (via tokens): {e}")
+
+            swap_info, final_state = v3_pool_swap_exact_out(
+                v3_pool=v3_pool,
+                token_out_address=tokenOut,
+                amount_out=amountOut,
+                sqrt_price_limit=sqrtPriceLimitX96,
+                silent=silent,
+            )
 
             # swap input is positive from the POV of the pool
             amountIn = max(
@@ -541,12 +747,7 @@ class UniswapTransaction(Transaction):
                     f"amountIn ({amountIn}) < amountOutMin ({amountInMaximum})"
                 )
 
-            return [
-                (
-                    v3_pool,
-                    final_state,
-                )
-            ]
+            return [PoolStateUpdate(v3_pool, final_state)]
 
         if func_name is None:
             func_name = self.func_name
@@ -554,6 +755,19 @@ class UniswapTransaction(Transaction):
         if func_params is None:
             func_params = self.func_params
 
+        # identical payloads inside a multicall predict identical pool
+        # states, so return a copy of the previous result
+        cache_key = None
+        if self._sim_cache is not None:
+            cache_key = (func_name, _freeze(func_params))
+            if (cached_state := self._sim_cache.get(cache_key)) is not None:
+                if not silent:
+                    print(f"{func_name}: using previously simulated result")
+                return [
+                    PoolStateUpdate(pool, dict(state))
+                    for pool, state in cached_state
+                ]
+
         future_state = []
 
         try:
@@ -562,20 +776,14 @@ class UniswapTransaction(Transaction):
             # UniswapV2 functions
             # -----------------------------------------------------
 
-            if func_name in (
-                "swapExactTokensForETH",
-                "swapExactTokensForETHSupportingFeeOnTransferTokens",
-            ):
+            if func_name in _V2_EXACT_IN_NAMES:
                 if not silent:
                     print(func_name)
                 future_state.extend(
                     v2_swap_exact_in(func_params, silent=silent)
                 )
 
-            elif func_name in (
-                "swapExactETHForTokens",
-                "swapExactETHForTokensSupportingFeeOnTransferTokens",
-            ):
+            elif func_name in _V2_EXACT_IN_ETH_NAMES:
                 if not silent:
                     print(func_name)
                 future_state.extend(
@@ -584,31 +792,14 @@ class UniswapTransaction(Transaction):
                     )
                 )
 
-            elif func_name in [
-                "swapExactTokensForTokens",
-                "swapExactTokensForTokensSupportingFeeOnTransferTokens",
-            ]:
-                if not silent:
-                    print(func_name)
-                future_state.extend(
-                    v2_swap_exact_in(func_params, silent=silent)
-                )
-
-            elif func_name in ("swapTokensForExactETH"):
-                if not silent:
-                    print(func_name)
-                future_state.extend(
-                    v2_swap_exact_out(params=func_params, silent=silent)
-                )
-
-            elif func_name in ("swapTokensForExactTokens"):
+            elif func_name in _V2_EXACT_OUT_NAMES:
                 if not silent:
                     print(func_name)
                 future_state.extend(
                     v2_swap_exact_out(params=func_params, silent=silent)
                 )
 
-            elif func_name in ("swapETHForExactTokens"):
+            elif func_name in _V2_EXACT_OUT_ETH_NAMES:
                 if not silent:
                     print(func_name)
                 future_state.extend(
@@ -638,58 +829,30 @@ class UniswapTransaction(Transaction):
                 if not silent:
                     print(func_name)
 
-                try:
-                    (
-                        exactInputParams_path,
-                        exactInputParams_recipient,
-                        exactInputParams_deadline,
-                        exactInputParams_amountIn,
-                        exactInputParams_amountOutMinimum,
-                    ) = func_params.get("params")
-                except:
-                    pass
+                raw_params = func_params["params"]
 
                 try:
-                    (
-                        exactInputParams_path,
-                        exactInputParams_recipient,
-                        exactInputParams_amountIn,
-                        exactInputParams_amountOutMinimum,
-                    ) = func_params.get("params")
-                except:
-                    pass
+                    fields = dict(
+                        zip(
+                            _V3_EXACT_INPUT_SCHEMAS[len(raw_params)],
+                            raw_params,
+                        )
+                    )
+                except KeyError:
+                    raise TransactionError(
+                        f"Could not decode exactInput params: {raw_params}"
+                    )
+
+                exactInputParams_path = fields["path"]
+                exactInputParams_recipient = fields["recipient"]
+                exactInputParams_deadline = fields.get("deadline")
+                exactInputParams_amountIn = fields["amountIn"]
+                exactInputParams_amountOutMinimum = fields["amountOutMinimum"]
 
                 # decode the path
-                path_pos = 0
-                exactInputParams_path_decoded = []
-                # read alternating 20 and 3 byte chunks from the encoded path,
-                # store each address (hex) and fee (int)
-                for byte_length in itertools.cycle((20, 3)):
-                    # stop at the end
-                    if path_pos == len(exactInputParams_path):
-                        break
-                    elif (
-                        byte_length == 20
-                        and len(exactInputParams_path)
-                        >= path_pos + byte_length
-                    ):
-                        address = exactInputParams_path[
-                            path_pos : path_pos + byte_length
-                        ].hex()
-                        exactInputParams_path_decoded.append(address)
-                    elif (
-                        byte_length == 3
-                        and len(exactInputParams_path)
-                        >= path_pos + byte_length
-                    ):
-                        fee = int(
-                            exactInputParams_path[
-                                path_pos : path_pos + byte_length
-                            ].hex(),
-                            16,
-                        )
-                        exactInputParams_path_decoded.append(fee)
-                    path_pos += byte_length
+                exactInputParams_path_decoded = decode_v3_path(
+                    exactInputParams_path
+                )
 
                 if not silent:
                     print(f" • path = {exactInputParams_path_decoded}")
@@ -701,34 +864,49 @@ class UniswapTransaction(Transaction):
                         f" • amountOutMinimum = {exactInputParams_amountOutMinimum}"
                     )
 
-                # decode the path - tokenIn is the first position, tokenOut is the second position
-                # e.g. tokenIn, fee, tokenOut
-                for token_pos in range(
-                    0,
-                    len(exactInputParams_path_decoded) - 2,
-                    2,
+                # get all V3 pools involved in the swap before simulating,
+                # each hop is (tokenIn, fee, tokenOut)
+                try:
+                    v3_pools = self.v3_pool_manager.get_pools_batch(
+                        pool_descriptors=[
+                            (tokenA, tokenB, fee)
+                            for tokenA, fee, tokenB in exactInputParams_path_decoded
+                        ],
+                        silent=silent,
+                    )
+                except (ManagerError, LiquidityPoolError) as e:
+                    raise TransactionError(
+                        f"Could not get pools (via tokens): {e}"
+                    )
+
+                for (tokenA, fee, tokenB), v3_pool in zip(
+                    exactInputParams_path_decoded, v3_pools
                 ):
-                    tokenIn = exactInputParams_path_decoded[token_pos]
-                    fee = exactInputParams_path_decoded[token_pos + 1]
-                    tokenOut = exactInputParams_path_decoded[token_pos + 2]
-
-                    v3_pool, swap_info, pool_state = v3_swap_exact_in(
-                        params={
-                            "params": (
-                                tokenIn,
-                                tokenOut,
-                                fee,
-                                # use amountIn for the first swap, otherwise take the output
-                                # amount of the last swap (always negative so we can check
-                                # for the min without knowing the token positions)
-                                exactInputParams_amountIn
-                                if token_pos == 0
-                                else min(swap_info.values()),
-                            )
-                        },
+                    self._v3_pool_cache[
+                        _v3_pool_key((tokenA, tokenB), fee)
+                    ] = v3_pool
+
+                # use amountIn for the first swap, otherwise take the output
+                # amount of the last swap
+                amount_in = exactInputParams_amountIn
+                future_state_append = future_state.append
+                for v3_pool, (tokenIn, _, _) in zip(
+                    v3_pools, exactInputParams_path_decoded
+                ):
+                    swap_info, pool_state = v3_pool_swap_exact_in(
+                        v3_pool=v3_pool,
+                        token_in_address=tokenIn,
+                        amount_in=amount_in,
                         silent=silent,
                     )
-                    future_state.append([v3_pool, pool_state])
+                    # V3 deltas follow the pool's sign convention (negative =
+                    # out), so the output is the negated min delta regardless
+                    # of the token positions
+                    amount_in = -min(
+                        swap_info["amount0_delta"],
+                        swap_info["amount1_delta"],
+                    )
+                    future_state_append(PoolStateUpdate(v3_pool, pool_state))
             elif func_name == "exactOutputSingle":
                 if not silent:
                     print(func_name)
@@ -742,60 +920,30 @@ class UniswapTransaction(Transaction):
                 if not silent:
                     print(func_name)
 
-                # Router ABI
-                try:
-                    (
-                        exactOutputParams_path,
-                        exactOutputParams_recipient,
-                        exactOutputParams_deadline,
-                        exactOutputParams_amountOut,
-                        exactOutputParams_amountInMaximum,
-                    ) = func_params.get("params")
-                except Exception as e:
-                    pass
-
-                # Router2 ABI
+                raw_params = func_params["params"]
+
                 try:
-                    (
-                        exactOutputParams_path,
-                        exactOutputParams_recipient,
-                        exactOutputParams_amountOut,
-                        exactOutputParams_amountInMaximum,
-                    ) = func_params.get("params")
-                except Exception as e:
-                    pass
+                    fields = dict(
+                        zip(
+                            _V3_EXACT_OUTPUT_SCHEMAS[len(raw_params)],
+                            raw_params,
+                        )
+                    )
+                except KeyError:
+                    raise TransactionError(
+                        f"Could not decode exactOutput params: {raw_params}"
+                    )
+
+                exactOutputParams_path = fields["path"]
+                exactOutputParams_recipient = fields["recipient"]
+                exactOutputParams_deadline = fields.get("deadline")
+                exactOutputParams_amountOut = fields["amountOut"]
+                exactOutputParams_amountInMaximum = fields["amountInMaximum"]
 
                 # decode the path
-                path_pos = 0
-                exactOutputParams_path_decoded = []
-                # read alternating 20 and 3 byte chunks from the encoded path,
-                # store each address (hex) and fee (int)
-                for byte_length in itertools.cycle((20, 3)):
-                    # stop at the end
-                    if path_pos == len(exactOutputParams_path):
-                        break
-                    elif (
-                        byte_length == 20
-                        and len(exactOutputParams_path)
-                        >= path_pos + byte_length
-                    ):
-                        address = exactOutputParams_path[
-                            path_pos : path_pos + byte_length
-                        ].hex()
-                        exactOutputParams_path_decoded.append(address)
-                    elif (
-                        byte_length == 3
-                        and len(exactOutputParams_path)
-                        >= path_pos + byte_length
-                    ):
-                        fee = int(
-                            exactOutputParams_path[
-                                path_pos : path_pos + byte_length
-                            ].hex(),
-                            16,
-                        )
-                        exactOutputParams_path_decoded.append(fee)
-                    path_pos += byte_length
+                exactOutputParams_path_decoded = decode_v3_path(
+                    exactOutputParams_path
+                )
 
                 if not silent:
                     print(f" • path = {exactOutputParams_path_decoded}")
@@ -807,109 +955,111 @@ class UniswapTransaction(Transaction):
                         f" • amountInMaximum = {exactOutputParams_amountInMaximum}"
                     )
 
+                # get all V3 pools involved in the swap before simulating
+                try:
+                    v3_pools = self.v3_pool_manager.get_pools_batch(
+                        pool_descriptors=[
+                            (tokenA, tokenB, fee)
+                            for tokenA, fee, tokenB in exactOutputParams_path_decoded
+                        ],
+                        silent=silent,
+                    )
+                except (ManagerError, LiquidityPoolError) as e:
+                    raise TransactionError(
+                        f"Could not get pools (via tokens): {e}"
+                    )
+
+                for (tokenA, fee, tokenB), v3_pool in zip(
+                    exactOutputParams_path_decoded, v3_pools
+                ):
+                    self._v3_pool_cache[
+                        _v3_pool_key((tokenA, tokenB), fee)
+                    ] = v3_pool
+
                 # the path is encoded in REVERSE order, so we decode from start to finish
                 # tokenOut is the first position, tokenIn is the second position
                 # e.g. tokenOut, fee, tokenIn
-                for token_pos in range(
-                    0,
-                    len(exactOutputParams_path_decoded) - 2,
-                    2,
+                # use amountOut for the last swap, otherwise take the input
+                # amount of the previous swap
+                amount_out = exactOutputParams_amountOut
+                future_state_append = future_state.append
+                for v3_pool, (tokenOut, _, _) in zip(
+                    v3_pools, exactOutputParams_path_decoded
                 ):
-                    tokenOut = exactOutputParams_path_decoded[token_pos]
-                    fee = exactOutputParams_path_decoded[token_pos + 1]
-                    tokenIn = exactOutputParams_path_decoded[token_pos + 2]
-
-                    v3_pool, swap_info, pool_state = v3_swap_exact_out(
-                        params={
-                            "params": (
-                                tokenIn,
-                                tokenOut,
-                                fee,
-                                # use amountOut for the last swap (token_pos == 0),
-                                # otherwise take the input amount of the previous swap
-                                # (always positive so we can check for the max without
-                                # knowing the token positions)
-                                exactOutputParams_amountOut
-                                if token_pos == 0
-                                else max(swap_info.values()),
-                            )
-                        },
+                    swap_info, pool_state = v3_pool_swap_exact_out(
+                        v3_pool=v3_pool,
+                        token_out_address=tokenOut,
+                        amount_out=amount_out,
                         silent=silent,
                     )
+                    # swap input is positive from the POV of the pool
+                    amount_out = max(
+                        swap_info["amount0_delta"],
+                        swap_info["amount1_delta"],
+                    )
 
-                    future_state.append([v3_pool, pool_state])
-            elif func_name in (
-                "addLiquidity",
-                "addLiquidityETH",
-                "removeLiquidity",
-                "removeLiquidityETH",
-                "removeLiquidityETHWithPermit",
-                "removeLiquidityETHSupportingFeeOnTransferTokens",
-                "removeLiquidityETHWithPermitSupportingFeeOnTransferTokens",
-                "removeLiquidityWithPermit",
-                "swapExactTokensForTokensSupportingFeeOnTransferTokens",
-                "swapExactETHForTokensSupportingFeeOnTransferTokens",
-                "swapExactTokensForETHSupportingFeeOnTransferTokens",
-            ):
+                    future_state_append(PoolStateUpdate(v3_pool, pool_state))
+            elif func_name in _LIQUIDITY_FUNCS:
                 # TODO: add prediction for these functions
                 if not silent:
-                    print(f"TODO: {func_name}")
-            elif func_name in (
-                "refundETH",
-                "selfPermit",
-                "selfPermitAllowed",
-                "unwrapWETH9",
-            ):
+                    logger.debug("TODO func %s", func_name)
+            elif func_name in _IGNORED_FUNCS:
                 # ignore, these functions do not affect future pool states
                 pass
             else:
-                print(f"\tUNHANDLED function: {func_name}")
+                logger.warning("UNHANDLED function: %s", func_name)
 
         # WIP: catch ValueError to avoid bad inputs to the swap bubbling out of the TX helper
         except (LiquidityPoolError, ValueError) as e:
             raise TransactionError(f"Transaction could not be calculated: {e}")
         else:
+            if cache_key is not None:
+                self._sim_cache[cache_key] = [
+                    PoolStateUpdate(pool, dict(state))
+                    for pool, state in future_state
+                ]
             return future_state
 
-    def simulate_multicall(self, silent: bool = False):
+    def simulate_multicall(
+        self, silent: bool = False
+    ) -> List[PoolStateUpdate]:
 
-        future_state = []
+        payloads = self.func_params.get("data") or []
 
-        for payload in self.func_params.get("data"):
-            try:
-                # decode with Router ABI
-                payload_func, payload_args = (
-                    web3.Web3()
-                    .eth.contract(abi=UNISWAP_V3_ROUTER_ABI)
-                    .decode_function_input(payload)
-                )
-            except:
-                pass
+        # multicalls often wrap a single swap, which can be simulated directly
+        if len(payloads) == 1:
+            payload_func_name, payload_args = _decode_multicall_payload(
+                payloads[0]
+            )
+            return self.simulate(
+                func_name=payload_func_name,
+                func_params=payload_args,
+                silent=silent,
+            )
 
-            try:
-                # decode with Router2 ABI
-                payload_func, payload_args = (
-                    web3.Web3()
-                    .eth.contract(abi=UNISWAP_V3_ROUTER2_ABI)
-                    .decode_function_input(payload)
-                )
-            except:
-                pass
+        # decode every payload up front, then simulate them in order and
+        # flatten the future states of each into a single list
+        decoded_payloads = [
+            _decode_multicall_payload(payload) for payload in payloads
+        ]
 
-            try:
-                # simulate each payload individually and append the future_state dict of that payload
-                # payload_pool, payload_state = self.simulate(
-                #     func_name=payload_func.fn_name,
-                #     func_params=payload_args,
-                # )
-                future_state.extend(
+        # cache results for the duration of this multicall only, nested
+        # multicalls share the cache of the outermost one
+        owns_sim_cache = self._sim_cache is None
+        if owns_sim_cache:
+            self._sim_cache = {}
+
+        try:
+            return list(
+                chain.from_iterable(
                     self.simulate(
-                        func_name=payload_func.fn_name,
+                        func_name=payload_func_name,
                         func_params=payload_args,
                         silent=silent,
                     )
+                    for payload_func_name, payload_args in decoded_payloads
                 )
-            except Exception as e:
-                raise TransactionError(f"Could not decode multicall: {e}")
-
-        return future_state
+            )
+        finally:
+            if owns_sim_cache:
+                self._sim_cache = None
@@ -1,3 +1,4 @@
+import functools
 import web3
 import eth_abi
 from typing import Tuple
@@ -33,4 +34,31 @@ def generate_v3_pool_address(token_addresses: Tuple[str], fee: int):
             )
         )[-20:].hex()
     )
-    return pool_address
\ No newline at end of file
+    return pool_address
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_v3_path(path_bytes: bytes) -> Tuple[Tuple[str, int, str], ...]:
+    """
+    Decode a packed V3 swap path (20 byte address, 3 byte fee, 20 byte
+    address, ...) into a tuple of (token_in, fee, token_out) hops, with the
+    addresses as hex strings.
+
+    Raises ValueError if the path is not a whole number of hops.
+
+    Results are cached, since the same routes are seen repeatedly.
+    """
+
+    if len(path_bytes) < 43 or (len(path_bytes) - 20) % 23:
+        raise ValueError(f"Invalid V3 path length ({len(path_bytes)} bytes)")
+
+    mv = memoryview(path_bytes)
+    n_hops = (len(mv) - 20) // 23
+    return tuple(
+        (
+            mv[o : o + 20].hex(),
+            int.from_bytes(mv[o + 20 : o + 23], "big"),
+            mv[o + 23 : o + 43].hex(),
+        )
+        for o in range(0, n_hops * 23, 23)
+    )
@@ -1,16 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
-from brownie import Contract
+from brownie import Contract, multicall, network
 from web3 import Web3
 
 from degenbot.constants import ZERO_ADDRESS
 from degenbot.exceptions import (
-    Erc20TokenError,
     LiquidityPoolError,
     ManagerError,
 )
 from degenbot.manager import Erc20TokenHelperManager, Manager
+from degenbot.token import Erc20Token
 from degenbot.uniswap.functions import generate_v3_pool_address
 from degenbot.uniswap.v2 import LiquidityPool
 from degenbot.uniswap.v2.abi import UNISWAPV2_FACTORY_ABI
@@ -25,6 +26,43 @@ class UniswapLiquidityPoolManager(Manager):
 
     _token_manager = Erc20TokenHelperManager()
 
+    def _get_sorted_token_helpers(
+        self,
+        token_addresses: Tuple[str],
+        silent: bool = False,
+    ) -> Tuple[Tuple[Erc20Token, Erc20Token], Tuple[str, str]]:
+        """
+        Get the Erc20Token helpers for a pair of token addresses, sorted by
+        address, and the tuple of sorted addresses used as a dictionary key
+        """
+
+        if len(token_addresses) != 2:
+            raise ValueError(
+                f"Expected two tokens, found {len(token_addresses)}"
+            )
+
+        # the token manager raises ManagerError if a helper cannot be built
+        erc20token_helpers = tuple(
+            [
+                self._token_manager.get_erc20token(
+                    address=token_address,
+                    min_abi=True,
+                    silent=silent,
+                    unload_brownie_contract_after_init=True,
+                )
+                for token_address in token_addresses
+            ]
+        )
+
+        # dictionary key pair is sorted by address
+        erc20token_helpers = (
+            min(erc20token_helpers),
+            max(erc20token_helpers),
+        )
+        tokens_key = tuple([token.address for token in erc20token_helpers])
+
+        return erc20token_helpers, tokens_key
+
 
 class UniswapV2LiquidityPoolManager(UniswapLiquidityPoolManager):
     """
@@ -99,34 +137,10 @@ class UniswapV2LiquidityPoolManager(UniswapLiquidityPoolManager):
 
         elif token_addresses is not None:
 
-            if len(token_addresses) != 2:
-                raise ValueError(
-                    f"Expected two tokens, found {len(token_addresses)}"
-                )
-
-            try:
-                erc20token_helpers = tuple(
-                    [
-                        self._token_manager.get_erc20token(
-                            address=token_address,
-                            min_abi=True,
-                            silent=silent,
-                            unload_brownie_contract_after_init=True,
-                        )
-                        for token_address in token_addresses
-                    ]
-                )
-            except Erc20TokenError:
-                raise ManagerError(
-                    f"Could not build Erc20Token helpers for pool {pool_address}"
-                )
-
-            # dictionary key pair is sorted by address
-            erc20token_helpers = (
-                min(erc20token_helpers),
-                max(erc20token_helpers),
+            erc20token_helpers, tokens_key = self._get_sorted_token_helpers(
+                token_addresses=token_addresses,
+                silent=silent,
             )
-            tokens_key = tuple([token.address for token in erc20token_helpers])
 
             if pool_helper := self.pools_by_tokens.get(tokens_key):
                 return pool_helper
@@ -150,6 +164,100 @@ class UniswapV2LiquidityPoolManager(UniswapLiquidityPoolManager):
                 self.pools_by_tokens[tokens_key] = pool_helper
                 return pool_helper
 
+    def get_pools_batch(
+        self,
+        token_address_pairs: List[Tuple[str]],
+        silent: bool = False,
+    ) -> List[LiquidityPool]:
+        """
+        Get the pool objects for a list of token address pairs, returned in
+        the same order as the pairs.
+
+        The factory `getPair` lookups for all unknown pools are issued together
+        using Brownie's built-in multicall for any network with the 'multicall2'
+        key set, otherwise they are fetched one by one. Helpers for the new pools
+        are then built in parallel threads.
+        """
+
+        tokens_keys = []
+        erc20token_helpers_by_key = {}
+
+        for token_addresses in token_address_pairs:
+            erc20token_helpers, tokens_key = self._get_sorted_token_helpers(
+                token_addresses=token_addresses,
+                silent=silent,
+            )
+            tokens_keys.append(tokens_key)
+            erc20token_helpers_by_key[tokens_key] = erc20token_helpers
+
+        unknown_keys = [
+            tokens_key
+            for tokens_key in erc20token_helpers_by_key
+            if tokens_key not in self.pools_by_tokens
+        ]
+
+        if unknown_keys:
+            # fetch the pair addresses for all unknown pools in a single
+            # request if multicall is available for the connected network
+            if network.main.CONFIG.active_network.get("multicall2"):
+                with multicall():
+                    pool_addresses = [
+                        self.factory_contract.getPair(*tokens_key)
+                        for tokens_key in unknown_keys
+                    ]
+            else:
+                pool_addresses = [
+                    self.factory_contract.getPair(*tokens_key)
+                    for tokens_key in unknown_keys
+                ]
+
+            new_pools = {}
+            for tokens_key, pool_address in zip(unknown_keys, pool_addresses):
+
+                if pool_address == ZERO_ADDRESS:
+                    raise ManagerError("No V2 LP available")
+
+                if pool_helper := self.pools_by_address.get(pool_address):
+                    with self.lock:
+                        self.pools_by_tokens[tokens_key] = pool_helper
+                else:
+                    new_pools[tokens_key] = pool_address
+
+            def build_pool(tokens_key: Tuple[str]) -> LiquidityPool:
+                try:
+                    return LiquidityPool(
+                        address=new_pools[tokens_key],
+                        tokens=erc20token_helpers_by_key[tokens_key],
+                        silent=silent,
+                    )
+                except Exception as e:
+                    raise ManagerError(
+                        f"Could not build V2 pool: {new_pools[tokens_key]}"
+                    ) from e
+
+            # each helper fetches its own state in the constructor, so build
+            # them in parallel threads instead of waiting on each in turn. A
+            # single pool is built directly to skip the thread start-up cost
+            if new_pools:
+                if len(new_pools) == 1:
+                    pool_helpers = [build_pool(next(iter(new_pools)))]
+                else:
+                    with ThreadPoolExecutor(
+                        max_workers=len(new_pools)
+                    ) as executor:
+                        pool_helpers = list(
+                            executor.map(build_pool, new_pools)
+                        )
+
+                with self.lock:
+                    for pool_helper, (tokens_key, pool_address) in zip(
+                        pool_helpers, new_pools.items()
+                    ):
+                        self.pools_by_address[pool_address] = pool_helper
+                        self.pools_by_tokens[tokens_key] = pool_helper
+
+        return [self.pools_by_tokens[tokens_key] for tokens_key in tokens_keys]
+
 
 class UniswapV3LiquidityPoolManager(UniswapLiquidityPoolManager):
     """
@@ -238,32 +346,10 @@ class UniswapV3LiquidityPoolManager(UniswapLiquidityPoolManager):
 
         elif token_addresses is not None and pool_fee is not None:
 
-            if len(token_addresses) != 2:
-                raise ValueError(
-                    f"Expected two tokens, found {len(token_addresses)}"
-                )
-
-            try:
-                erc20token_helpers = tuple(
-                    [
-                        self._token_manager.get_erc20token(
-                            address=token_address,
-                            min_abi=True,
-                            silent=silent,
-                            unload_brownie_contract_after_init=True,
-                        )
-                        for token_address in token_addresses
-                    ]
-                )
-            except Erc20TokenError:
-                raise ManagerError("Could not build Erc20Token helpers")
-
-            # dictionary key pair is sorted by address
-            erc20token_helpers = (
-                min(erc20token_helpers),
-                max(erc20token_helpers),
+            erc20token_helpers, tokens_key = self._get_sorted_token_helpers(
+                token_addresses=token_addresses,
+                silent=silent,
             )
-            tokens_key = tuple([token.address for token in erc20token_helpers])
             dict_key = *tokens_key, pool_fee
 
             if pool_helper := self.pools_by_tokens_and_fee.get(dict_key):
@@ -290,3 +376,82 @@ class UniswapV3LiquidityPoolManager(UniswapLiquidityPoolManager):
                 self.pools_by_address[pool_address] = pool_helper
                 self.pools_by_tokens_and_fee[dict_key] = pool_helper
                 return pool_helper
+
+    def get_pools_batch(
+        self,
+        pool_descriptors: List[Tuple[str, str, int]],
+        silent: bool = False,
+    ) -> List[V3LiquidityPool]:
+        """
+        Get the pool objects for a list of (token, token, fee) descriptors,
+        returned in the same order as the descriptors.
+
+        V3 pool addresses are generated deterministically, so no factory
+        lookups are required. Helpers for the new pools are built in parallel
+        threads.
+        """
+
+        dict_keys = []
+        erc20token_helpers_by_key = {}
+
+        for *token_addresses, pool_fee in pool_descriptors:
+            erc20token_helpers, tokens_key = self._get_sorted_token_helpers(
+                token_addresses=token_addresses,
+                silent=silent,
+            )
+            dict_key = *tokens_key, pool_fee
+            dict_keys.append(dict_key)
+            erc20token_helpers_by_key[dict_key] = erc20token_helpers
+
+        new_pools = {}
+        for dict_key in erc20token_helpers_by_key:
+
+            if dict_key in self.pools_by_tokens_and_fee:
+                continue
+
+            *tokens_key, pool_fee = dict_key
+            pool_address = generate_v3_pool_address(
+                token_addresses=tokens_key, fee=pool_fee
+            )
+
+            if pool_helper := self.pools_by_address.get(pool_address):
+                with self.lock:
+                    self.pools_by_tokens_and_fee[dict_key] = pool_helper
+            else:
+                new_pools[dict_key] = pool_address
+
+        def build_pool(dict_key: Tuple[str, str, int]) -> V3LiquidityPool:
+            try:
+                return V3LiquidityPool(
+                    address=new_pools[dict_key],
+                    lens=self.lens,
+                    tokens=erc20token_helpers_by_key[dict_key],
+                    silent=silent,
+                )
+            except Exception as e:
+                raise ManagerError(
+                    f"Could not build V3 pool: {new_pools[dict_key]}"
+                ) from e
+
+        # each helper fetches its own state in the constructor, so build
+        # them in parallel threads instead of waiting on each in turn. A
+        # single pool is built directly to skip the thread start-up cost
+        if new_pools:
+            if len(new_pools) == 1:
+                pool_helpers = [build_pool(next(iter(new_pools)))]
+            else:
+                with ThreadPoolExecutor(
+                    max_workers=len(new_pools)
+                ) as executor:
+                    pool_helpers = list(executor.map(build_pool, new_pools))
+
+            with self.lock:
+                for pool_helper, (dict_key, pool_address) in zip(
+                    pool_helpers, new_pools.items()
+                ):
+                    self.pools_by_address[pool_address] = pool_helper
+                    self.pools_by_tokens_and_fee[dict_key] = pool_helper
+
+        return [
+            self.pools_by_tokens_and_fee[dict_key] for dict_key in dict_keys
+        ]